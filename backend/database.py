@@ -68,3 +68,9 @@ def update_visit(patient_id: str, visit_id: str, update_data: dict):
         {"patient_id": patient_id, "visits.visit_id": visit_id},
         {"$set": {f"visits.$.{key}": value for key, value in update_data.items()}}
     )
+
+def get_worklist_collection() -> Collection:
+    collection = db_manager.get_collection("worklist")
+    collection.create_index([("patient_id", 1), ("test_name", 1)], unique=True)
+    collection.create_index([("status", 1), ("due_date", 1)])
+    return collection
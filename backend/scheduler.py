@@ -0,0 +1,193 @@
+import argparse
+import time
+import uuid
+from typing import Dict, Iterator, List
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from medical_guidelines import guidelines
+from database import db_manager, get_patients_collection, get_worklist_collection
+
+BATCH_SIZE = 1000
+
+# Only the fields the validity rules need: age, every recommended test name
+# and a flat list of {test_name, test_date} pairs. Visit symptoms, lab
+# parameters and interpretations never leave the server.
+PATIENT_PROJECTION_PIPELINE = [
+    {
+        "$project": {
+            "_id": 0,
+            "patient_id": 1,
+            "age": "$profile.age",
+            "recommended": {
+                "$reduce": {
+                    "input": {"$ifNull": ["$visits", []]},
+                    "initialValue": [],
+                    "in": {
+                        "$setUnion": [
+                            "$$value",
+                            {"$ifNull": ["$$this.recommended_tests.test_name", []]}
+                        ]
+                    }
+                }
+            },
+            "results": {
+                "$reduce": {
+                    "input": {"$ifNull": ["$visits", []]},
+                    "initialValue": [],
+                    "in": {
+                        "$concatArrays": [
+                            "$$value",
+                            {
+                                "$map": {
+                                    "input": {"$ifNull": ["$$this.lab_results", []]},
+                                    "as": "result",
+                                    "in": {
+                                        "test_name": "$$result.test_name",
+                                        "test_date": "$$result.test_date"
+                                    }
+                                }
+                            }
+                        ]
+                    }
+                }
+            }
+        }
+    }
+]
+
+class WorklistScheduler:
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        self.guidelines = guidelines
+        self.batch_size = batch_size
+
+    def _stream_patients(self) -> Iterator[Dict]:
+        collection = get_patients_collection()
+        return collection.aggregate(
+            PATIENT_PROJECTION_PIPELINE,
+            batchSize=self.batch_size,
+            allowDiskUse=True
+        )
+
+    def _get_key_tests(self, patient: Dict) -> List[str]:
+        key_tests = set(patient.get('recommended') or [])
+
+        age = patient.get('age')
+        if age is not None:
+            key_tests.update(self.guidelines.get_age_specific_tests(age))
+
+        return list(key_tests)
+
+    def _get_last_test_dates(self, patient: Dict) -> Dict[str, datetime]:
+        last_dates = {}
+
+        for result in patient.get('results') or []:
+            test_name = result.get('test_name')
+            test_date = result.get('test_date')
+            if not test_name or not test_date:
+                continue
+
+            test_date = datetime.fromisoformat(test_date) if isinstance(test_date, str) else test_date
+            if test_name not in last_dates or test_date > last_dates[test_name]:
+                last_dates[test_name] = test_date
+
+        return last_dates
+
+    def compute_due_tests(self, patient: Dict, now: datetime, horizon_days: int) -> List[Dict]:
+        horizon = now + timedelta(days=horizon_days)
+        last_dates = self._get_last_test_dates(patient)
+
+        due_tests = []
+
+        for test_name in self._get_key_tests(patient):
+            last_test_date = last_dates.get(test_name)
+            validity_days = self.guidelines.get_test_validity_days(test_name)
+
+            if last_test_date is None:
+                due_date = None
+                status = "overdue"
+            else:
+                due_date = last_test_date + timedelta(days=validity_days)
+                if due_date <= now:
+                    status = "overdue"
+                elif due_date <= horizon:
+                    status = "due"
+                else:
+                    continue
+
+            due_tests.append({
+                "patient_id": patient['patient_id'],
+                "test_name": test_name,
+                "status": status,
+                "due_date": due_date,
+                "last_test_date": last_test_date,
+                "validity_days": validity_days
+            })
+
+        return due_tests
+
+    def run(self, horizon_days: int = 30) -> Dict:
+        worklist = get_worklist_collection()
+        run_id = str(uuid.uuid4())
+        now = datetime.now()
+        start = time.perf_counter()
+
+        patients_scanned = 0
+        entries_written = 0
+        operations = []
+
+        def flush():
+            nonlocal entries_written
+            if operations:
+                worklist.bulk_write(operations, ordered=False)
+                entries_written += len(operations)
+                operations.clear()
+
+        for patient in self._stream_patients():
+            patients_scanned += 1
+
+            for entry in self.compute_due_tests(patient, now, horizon_days):
+                entry.update({"run_id": run_id, "generated_at": now})
+                operations.append(UpdateOne(
+                    {"patient_id": entry['patient_id'], "test_name": entry['test_name']},
+                    {"$set": entry},
+                    upsert=True
+                ))
+
+            if len(operations) >= self.batch_size:
+                flush()
+
+        flush()
+
+        # Entries not refreshed by this run are no longer due (tested since, or
+        # pushed beyond the horizon).
+        stale = worklist.delete_many({"run_id": {"$ne": run_id}})
+
+        elapsed = time.perf_counter() - start
+        return {
+            "run_id": run_id,
+            "horizon_days": horizon_days,
+            "patients_scanned": patients_scanned,
+            "entries_written": entries_written,
+            "entries_removed": stale.deleted_count,
+            "elapsed_seconds": round(elapsed, 3),
+            "patients_per_second": round(patients_scanned / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+worklist_scheduler = WorklistScheduler()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the worklist of lab tests due or overdue")
+    parser.add_argument("--days", type=int, default=30, help="Include tests expiring within this many days")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Cursor and bulk write batch size")
+    args = parser.parse_args()
+
+    db_manager.connect()
+    try:
+        report = WorklistScheduler(batch_size=args.batch_size).run(horizon_days=args.days)
+        print(
+            f"Worklist run {report['run_id']}: {report['patients_scanned']} patients scanned, "
+            f"{report['entries_written']} entries written, {report['entries_removed']} removed "
+            f"in {report['elapsed_seconds']}s ({report['patients_per_second']} patients/s)"
+        )
+    finally:
+        db_manager.close()